@@ -0,0 +1,205 @@
+"""Barnes-Hut octree approximation of the pairwise gravitational
+   acceleration.
+
+   Direct summation costs O(N^2) per time step.  The Barnes-Hut scheme
+   builds an octree over the particle positions, stores the total mass
+   and center of mass of each cell, and lets a distant group of
+   particles act like a single pseudo-particle.  A cell of width w at
+   distance d is "far enough" when w/d < theta, so the work per
+   particle drops to O(log N) for reasonable theta (0.5 is the usual
+   choice; theta = 0 recovers exact direct summation).
+
+   The tree is stored in flat arrays (one row per node) rather than
+   linked Python objects so that building and traversing it can be
+   compiled with numba when it's available.
+"""
+
+import math
+
+import numpy as np
+
+# Numba is optional here just like in sim.py; without it the same
+# functions run as plain Python, which is still O(N log N) but with
+# interpreter overhead.
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    prange = range
+
+
+def _build(pos, mass, center, half, children, particle, is_leaf,
+           node_mass, com):
+    """Insert all particles into the tree arrays, accumulating mass and
+       center of mass on every node along each insertion path.  The
+       root cell (node 0) must already be initialized by the caller.
+       Returns the number of nodes used, or -1 if the arrays are too
+       small, in which case the caller should retry with more capacity.
+    """
+    capacity = half.shape[0]
+    n_nodes = 1
+    # Cells this small only arise from (near-)coincident particles;
+    # stop subdividing and let such particles share a leaf, where they
+    # act through the leaf's combined center of mass.
+    min_half = 1e-12*half[0]
+    for p in range(pos.shape[0]):
+        m = mass[p]
+        n = 0
+        while True:
+            node_mass[n] += m
+            com[n, 0] += m*pos[p, 0]
+            com[n, 1] += m*pos[p, 1]
+            com[n, 2] += m*pos[p, 2]
+            if is_leaf[n]:
+                if particle[n] == -1:
+                    # Empty leaf: the particle just lives here
+                    particle[n] = p
+                    break
+                if half[n] <= min_half:
+                    # Degenerate cell: merge instead of subdividing
+                    # forever
+                    break
+                # Occupied leaf: push the resident particle down one
+                # level, then keep descending with the new one
+                q = particle[n]
+                particle[n] = -1
+                is_leaf[n] = False
+                oct_q = (4*(pos[q, 0] > center[n, 0])
+                         + 2*(pos[q, 1] > center[n, 1])
+                         + (pos[q, 2] > center[n, 2]))
+                if n_nodes >= capacity:
+                    return -1
+                c = n_nodes
+                n_nodes += 1
+                h = 0.5*half[n]
+                center[c, 0] = center[n, 0] + (h if pos[q, 0] > center[n, 0] else -h)
+                center[c, 1] = center[n, 1] + (h if pos[q, 1] > center[n, 1] else -h)
+                center[c, 2] = center[n, 2] + (h if pos[q, 2] > center[n, 2] else -h)
+                half[c] = h
+                particle[c] = q
+                node_mass[c] = mass[q]
+                com[c, 0] = mass[q]*pos[q, 0]
+                com[c, 1] = mass[q]*pos[q, 1]
+                com[c, 2] = mass[q]*pos[q, 2]
+                children[n, oct_q] = c
+            # Internal node: descend into the octant that holds p,
+            # creating the child cell if it doesn't exist yet
+            oct_p = (4*(pos[p, 0] > center[n, 0])
+                     + 2*(pos[p, 1] > center[n, 1])
+                     + (pos[p, 2] > center[n, 2]))
+            c = children[n, oct_p]
+            if c == -1:
+                if n_nodes >= capacity:
+                    return -1
+                c = n_nodes
+                n_nodes += 1
+                h = 0.5*half[n]
+                center[c, 0] = center[n, 0] + (h if pos[p, 0] > center[n, 0] else -h)
+                center[c, 1] = center[n, 1] + (h if pos[p, 1] > center[n, 1] else -h)
+                center[c, 2] = center[n, 2] + (h if pos[p, 2] > center[n, 2] else -h)
+                half[c] = h
+                children[n, oct_p] = c
+            n = c
+    # Normalize the accumulated centers of mass
+    for n in range(n_nodes):
+        if node_mass[n] > 0:
+            com[n, 0] /= node_mass[n]
+            com[n, 1] /= node_mass[n]
+            com[n, 2] /= node_mass[n]
+    return n_nodes
+
+
+def _accel(pos, G, theta, eps2, n_nodes, half, children, particle,
+           is_leaf, node_mass, com, acc):
+    """Walk the tree once per particle and accumulate the acceleration
+       into acc.  A cell is taken whole when (2*half/d) < theta or when
+       it's a leaf; otherwise its children are pushed onto the stack.
+       The leaf holding the target particle itself is skipped outright
+       (rounding in the center-of-mass division means its separation
+       isn't exactly zero).
+    """
+    n = pos.shape[0]
+    theta2 = theta*theta
+    for i in prange(n):
+        px = pos[i, 0]
+        py = pos[i, 1]
+        pz = pos[i, 2]
+        ax = 0.0
+        ay = 0.0
+        az = 0.0
+        # Explicit stack instead of recursion; n_nodes is a safe upper
+        # bound on how deep it can get
+        stack = np.empty(n_nodes, np.int64)
+        stack[0] = 0
+        sp = 1
+        while sp > 0:
+            sp -= 1
+            nd = stack[sp]
+            if particle[nd] == i:
+                # The target's own leaf
+                continue
+            dx = px - com[nd, 0]
+            dy = py - com[nd, 1]
+            dz = pz - com[nd, 2]
+            r2 = dx*dx + dy*dy + dz*dz + eps2
+            # Opening criterion: width^2 < theta^2 * d^2
+            if is_leaf[nd] or 4.0*half[nd]*half[nd] < theta2*r2:
+                # 1/sqrt plus two multiplies is cheaper than a pow
+                inv_r = 1.0/math.sqrt(r2)
+                inv_r3 = inv_r*inv_r*inv_r
+                ax -= G*node_mass[nd]*dx*inv_r3
+                ay -= G*node_mass[nd]*dy*inv_r3
+                az -= G*node_mass[nd]*dz*inv_r3
+            else:
+                for o in range(8):
+                    c = children[nd, o]
+                    if c != -1:
+                        stack[sp] = c
+                        sp += 1
+        acc[i, 0] = ax
+        acc[i, 1] = ay
+        acc[i, 2] = az
+
+
+if HAVE_NUMBA:
+    _build = njit(cache=True)(_build)
+    _accel = njit(cache=True, parallel=True, fastmath=True)(_accel)
+
+
+def accelerations(pos, mass, G, theta, eps2):
+    """Compute the Barnes-Hut approximation of the gravitational
+       acceleration on every particle.  pos is an (N, 3) array and mass
+       an (N,) array, both plain floats in consistent units; returns an
+       (N, 3) acceleration array in the same units.
+    """
+    n = pos.shape[0]
+    acc = np.zeros((n, 3))
+    if n == 0:
+        return acc
+    # Root cell: a cube just big enough to hold every particle
+    lo = pos.min(axis=0)
+    hi = pos.max(axis=0)
+    root_center = 0.5*(lo + hi)
+    root_half = 0.5*float((hi - lo).max())*1.0001 + 1e-30
+    # The node arrays grow geometrically if the first guess at the
+    # tree size turns out to be too small
+    capacity = max(64, 8*n)
+    while True:
+        center = np.zeros((capacity, 3))
+        half = np.zeros(capacity)
+        children = np.full((capacity, 8), -1, np.int64)
+        particle = np.full(capacity, -1, np.int64)
+        is_leaf = np.ones(capacity, np.bool_)
+        node_mass = np.zeros(capacity)
+        com = np.zeros((capacity, 3))
+        center[0] = root_center
+        half[0] = root_half
+        n_nodes = _build(pos, mass, center, half, children, particle,
+                         is_leaf, node_mass, com)
+        if n_nodes != -1:
+            break
+        capacity *= 2
+    _accel(pos, G, theta, eps2, n_nodes, half, children, particle,
+           is_leaf, node_mass, com, acc)
+    return acc
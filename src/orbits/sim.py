@@ -1,8 +1,223 @@
 import math
+from dataclasses import dataclass
+
 import numpy as np
 from astropy import units as u
 from astropy import constants as const
 
+from . import octree
+
+# Numba is optional.  When it's available the inner integration step
+# runs as a compiled, multithreaded kernel; otherwise run() falls back
+# to the vectorized numpy version.
+try:
+    from numba import njit, prange, get_num_threads, get_thread_id
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+# The CUDA backend additionally needs a working GPU; defining the
+# kernel itself is lazy, so this import is safe without one.
+try:
+    from numba import cuda
+    HAVE_CUDA = cuda.is_available()
+except ImportError:
+    HAVE_CUDA = False
+
+# Number of threads per CUDA block, which is also the size of the
+# shared-memory tile of source objects each block works through
+_CUDA_BLOCK = 64
+
+# Tile size for the blocked numpy force evaluation: 64 objects of
+# positions plus the 64x64 pair table stay comfortably inside L1/L2
+_TILE = 64
+
+
+if HAVE_NUMBA:
+    # Note: no cache=True here; the thread-id intrinsics used for the
+    # pair-symmetric accumulation keep numba from caching this kernel
+    # to disk, so it's compiled once per process instead.
+    @njit(parallel=True, fastmath=True)
+    def _accel_direct(pos, mass, G, eps2, acc):
+        """Direct-summation gravitational acceleration.  Takes an
+           (N, 3) position array and writes the acceleration on every
+           object into acc.  All values are plain floats in simulation
+           units.  eps2 is the squared softening length, which keeps
+           the force finite in close encounters.
+
+           Newton's third law is exploited: each pair (k, j) with
+           j > k is evaluated once and its contribution applied to
+           both objects, halving the work of the pair loop.  Because
+           several threads can then touch the same object, each thread
+           accumulates into its own slice of a per-thread buffer,
+           which is reduced at the end.
+        """
+        n = pos.shape[0]
+        n_threads = get_num_threads()
+        partial = np.zeros((n_threads, n, 3))
+        for k in prange(n):
+            tid = get_thread_id()
+            for j in range(k + 1, n):
+                dx = pos[k, 0] - pos[j, 0]
+                dy = pos[k, 1] - pos[j, 1]
+                dz = pos[k, 2] - pos[j, 2]
+                r2 = dx*dx + dy*dy + dz*dz + eps2
+                # 1/sqrt then two multiplies instead of a pow call;
+                # with fastmath LLVM can use the hardware reciprocal
+                # square root here
+                inv_r = 1.0/math.sqrt(r2)
+                g_r3 = G*inv_r*inv_r*inv_r
+                # Equal and opposite: k is pulled toward j and vice
+                # versa, with the partner's mass setting the strength
+                fk = g_r3*mass[j]
+                fj = g_r3*mass[k]
+                partial[tid, k, 0] -= fk*dx
+                partial[tid, k, 1] -= fk*dy
+                partial[tid, k, 2] -= fk*dz
+                partial[tid, j, 0] += fj*dx
+                partial[tid, j, 1] += fj*dy
+                partial[tid, j, 2] += fj*dz
+        # Reduce the per-thread buffers into the output
+        for k in prange(n):
+            ax = 0.0
+            ay = 0.0
+            az = 0.0
+            for t in range(n_threads):
+                ax += partial[t, k, 0]
+                ay += partial[t, k, 1]
+                az += partial[t, k, 2]
+            acc[k, 0] = ax
+            acc[k, 1] = ay
+            acc[k, 2] = az
+
+
+if HAVE_CUDA:
+    @cuda.jit
+    def _accel_cuda(pos, mass, G, eps2, acc):
+        """Direct-summation acceleration on the GPU, one thread per
+           target object.  Each block stages a tile of source positions
+           and masses in shared memory, so every source is read from
+           global memory once per block rather than once per thread.
+        """
+        sh_pos = cuda.shared.array((_CUDA_BLOCK, 3), np.float64)
+        sh_m = cuda.shared.array(_CUDA_BLOCK, np.float64)
+        i = cuda.grid(1)
+        tx = cuda.threadIdx.x
+        n = pos.shape[0]
+        px = 0.0
+        py = 0.0
+        pz = 0.0
+        if i < n:
+            px = pos[i, 0]
+            py = pos[i, 1]
+            pz = pos[i, 2]
+        ax = 0.0
+        ay = 0.0
+        az = 0.0
+        for start in range(0, n, _CUDA_BLOCK):
+            # Cooperatively load the next tile of sources
+            j = start + tx
+            if j < n:
+                sh_pos[tx, 0] = pos[j, 0]
+                sh_pos[tx, 1] = pos[j, 1]
+                sh_pos[tx, 2] = pos[j, 2]
+                sh_m[tx] = mass[j]
+            cuda.syncthreads()
+            if i < n:
+                tile = min(_CUDA_BLOCK, n - start)
+                for jj in range(tile):
+                    if start + jj != i:
+                        dx = px - sh_pos[jj, 0]
+                        dy = py - sh_pos[jj, 1]
+                        dz = pz - sh_pos[jj, 2]
+                        inv_r = 1.0/math.sqrt(dx*dx + dy*dy + dz*dz
+                                              + eps2)
+                        inv_r3 = inv_r*inv_r*inv_r
+                        ax -= G*sh_m[jj]*dx*inv_r3
+                        ay -= G*sh_m[jj]*dy*inv_r3
+                        az -= G*sh_m[jj]*dz*inv_r3
+            cuda.syncthreads()
+        if i < n:
+            acc[i, 0] = ax
+            acc[i, 1] = ay
+            acc[i, 2] = az
+
+
+if HAVE_NUMBA:
+    @njit(cache=True, parallel=True, fastmath=True)
+    def _accel_direct_batch(pos, mass, G, eps2, acc):
+        """Batched direct-summation acceleration for an ensemble of
+           systems.  pos is (B, N, 3): B independent copies of the
+           same N objects at different states.  The ensembles
+           parallelize across threads; within one ensemble the pair
+           loop is serial, so the third-law accumulation needs no
+           per-thread buffers here.
+        """
+        n_batch = pos.shape[0]
+        n = pos.shape[1]
+        for b in prange(n_batch):
+            for k in range(n):
+                acc[b, k, 0] = 0.0
+                acc[b, k, 1] = 0.0
+                acc[b, k, 2] = 0.0
+            for k in range(n):
+                for j in range(k + 1, n):
+                    dx = pos[b, k, 0] - pos[b, j, 0]
+                    dy = pos[b, k, 1] - pos[b, j, 1]
+                    dz = pos[b, k, 2] - pos[b, j, 2]
+                    inv_r = 1.0/math.sqrt(dx*dx + dy*dy + dz*dz + eps2)
+                    g_r3 = G*inv_r*inv_r*inv_r
+                    fk = g_r3*mass[j]
+                    fj = g_r3*mass[k]
+                    acc[b, k, 0] -= fk*dx
+                    acc[b, k, 1] -= fk*dy
+                    acc[b, k, 2] -= fk*dz
+                    acc[b, j, 0] += fj*dx
+                    acc[b, j, 1] += fj*dy
+                    acc[b, j, 2] += fj*dz
+
+
+def warmup():
+    """Compile all the numba kernels now instead of on first use.
+
+       The first call into a jitted kernel pays the JIT compilation
+       cost (seconds), which is jarring in the middle of a run() in a
+       notebook or a short script.  Calling warmup() once up front --
+       e.g. right after import, or in CI before timing anything --
+       moves that cost to a predictable place.  Kernels compiled with
+       cache=True additionally persist to disk, so their cost is paid
+       once per machine rather than once per process.  Without numba
+       this is a no-op.
+
+       (numba's old pycc ahead-of-time compiler would have avoided the
+       cost entirely, but it was removed from numba upstream, so eager
+       compilation plus the on-disk cache is the supported route.)
+    """
+    if not HAVE_NUMBA:
+        return
+    pos = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]])
+    mass = np.ones(2)
+    acc = np.empty((2, 3))
+    _accel_direct(pos, mass, 1.0, 1e-30, acc)
+    _accel_direct_batch(pos[None, :, :], mass, 1.0, 1e-30,
+                        np.empty((1, 2, 3)))
+    octree.accelerations(pos, mass, 1.0, 0.5, 1e-30)
+
+
+@dataclass(slots=True)
+class SimObject:
+    """Metadata for one object in a simulation: its name, mass and
+       radius (Quantities in simulation units), and idx, the object's
+       row in the SimRun trajectory arrays.  Attribute access on a
+       slotted dataclass is faster and leaner than the dict records
+       these used to be.
+    """
+    name: str
+    mass: u.Quantity
+    radius: u.Quantity
+    idx: int
+
+
 class SimRun:
     """ Encapsulates all of the information for one run of a gravitational
         simulation
@@ -15,86 +230,337 @@ class SimRun:
 
     def __init__(self, dt, maxtime,
                  len_unit = u.meter, time_unit = u.second,
-                 mass_unit=u.kilogram):
+                 mass_unit=u.kilogram, softening=0*u.meter,
+                 algorithm='direct', theta=0.5, integrator='verlet',
+                 device='cpu', dtype=np.float64):
         """Construct a simulation run for a particular time "maxtime" broken
            into time steps of length "dt".  Change the default units with
            optional parameters.  Specify dt and maxtime as
            astropy.units.Quantity objects.
+
+           "softening" is an optional length added in quadrature to
+           every pair separation, which keeps the force finite during
+           close encounters (a standard trick for collisionless
+           simulations).  The default of zero leaves the force law
+           exact.
+
+           "algorithm" selects how the gravitational acceleration is
+           computed: 'direct' sums over all pairs exactly (O(N^2) per
+           step), while 'barnes_hut' approximates distant groups of
+           objects by their center of mass using an octree (O(N log N)
+           per step).  "theta" is the Barnes-Hut opening angle; smaller
+           values are more accurate but slower, and theta = 0
+           reproduces direct summation.
+
+           "integrator" selects the update rule for each time step:
+           'verlet' (the default) is velocity Verlet, which is
+           symplectic and conserves energy to O(dt^2) over long runs;
+           'euler' reproduces the original scheme, which reuses the
+           acceleration from the start of the step and drifts in
+           energy.  Both cost one force evaluation per step.
+
+           "device" is 'cpu' (default) or 'cuda'.  With 'cuda' the
+           direct force summation runs as a GPU kernel (requires numba
+           with a working CUDA installation), which pays off for runs
+           with thousands of objects.
+
+           "dtype" is the floating-point type used to store the
+           trajectories (np.float64 by default).  np.float32 halves
+           the memory and bandwidth, which helps big bandwidth-bound
+           runs; accelerations are still accumulated in float64, so
+           the cost is trajectory precision (~7 significant digits),
+           not force accuracy.
         """
+        if algorithm not in ('direct', 'barnes_hut'):
+            raise ValueError(f"Unknown algorithm '{algorithm}'")
+        if integrator not in ('euler', 'verlet'):
+            raise ValueError(f"Unknown integrator '{integrator}'")
+        if device not in ('cpu', 'cuda'):
+            raise ValueError(f"Unknown device '{device}'")
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError("dtype must be np.float32 or np.float64")
+        if device == 'cuda':
+            if not HAVE_CUDA:
+                raise RuntimeError("device='cuda' requires numba with "
+                                   "a working CUDA installation")
+            if algorithm == 'barnes_hut':
+                raise ValueError("device='cuda' only supports "
+                                 "algorithm='direct'")
+        self.algorithm = algorithm
+        self.theta = theta
+        self.integrator = integrator
+        self.device = device
+        self.dtype = np.dtype(dtype)
+        # Device-side copy of the mass array, created on first use
+        self._d_mass = None
+        # Scratch buffers for the tiled numpy force evaluation,
+        # created on first use
+        self._scratch = None
         self.dt = dt.to(time_unit)
         # Allow one extra time step to store the initial values
         # math.ceil is to handle the case where dt doesn't divide
         # evenly into maxtime
-        self.n_steps = math.ceil(maxtime.to(time_unit).value/self.dt.value) + 1
+        self.n_steps = math.ceil(maxtime.to_value(time_unit)/self.dt.value) + 1
         # In the case that the given "maxtime" doesn't divide evenly by "dt,"
         # set the actual maxtime of this simulation to the end time
         self.maxtime = dt*(self.n_steps-1)
         self.objects = []
+        # Structure-of-arrays trajectory storage, in simulation units.
+        # self.positions[i] and self.velocities[i] are contiguous
+        # (n_objects, 3) snapshots of the whole system at step i --
+        # exactly the slices the integrator reads and writes -- so each
+        # step touches one stride of memory with no per-object
+        # indirection.  Object k's trajectory is the (non-contiguous)
+        # view self.positions[:, k].
+        self.positions = np.zeros((self.n_steps, 0, 3), self.dtype)
+        self.velocities = np.zeros((self.n_steps, 0, 3), self.dtype)
+        self.mass = np.zeros(0)
+        self.radius = np.zeros(0)
         self.len_unit = len_unit
         self.time_unit = time_unit
         self.mass_unit = mass_unit
         self.G = const.G.to((self.len_unit**3)/
                             ((self.mass_unit)*(self.time_unit**2)))
-        
+        # Cache plain-float versions of G and dt so that run() never has
+        # to do Quantity arithmetic inside the time-step loop.  Every
+        # Quantity operation allocates a new unit object and copies the
+        # underlying array, which is far too slow to repeat N^2 times
+        # per step.
+        self._G = self.G.value
+        self._dt = self.dt.value
+        self._dt2_half = 0.5*self._dt**2
+        # The time axis never depends on the integration, so it can be
+        # filled in completely up front instead of once per step
+        self.times = np.arange(self.n_steps, dtype=np.float64)*self._dt
+        self.softening = softening << self.len_unit
+        # Squared softening length for the inner loop.  A tiny floor
+        # keeps the self-interaction term finite so the kernel can mask
+        # it by multiplication instead of branching; 1e-30 is utterly
+        # negligible compared to any real pair separation.
+        eps2 = self.softening.value**2
+        self._eps2 = eps2 if eps2 > 0 else 1e-30
+
     def add_object(self, name, x0, y0, z0, vx0, vy0, vz0, m, r):
         """Add one object to the simulation.  Call this for all
            objects before calling "run()"
         """
-        # This is a numpy record array to hold the (x,y,z,vx,vy,vz,t)
-        # values of the objects trajectory.
-        # The array is long enough to hold all the values that will be
-        # claculated during this simulation.
-        pvt = u.Quantity(np.zeros(self.n_steps,
-                                  dtype=SimRun.datatype),
-                         u.StructuredUnit((self.len_unit,
-                                           self.len_unit/self.time_unit,
-                                           self.time_unit)))
-        # Initialize the first position, velocity, and time entry
-        # to the initial value and t = 0
-        pvt[0]['p'][0]=x0.to(self.len_unit)
-        pvt[0]['p'][1]=y0.to(self.len_unit)
-        pvt[0]['p'][2]=z0.to(self.len_unit)
-        pvt[0]['v'][0]=vx0.to(self.len_unit/self.time_unit)
-        pvt[0]['v'][1]=vy0.to(self.len_unit/self.time_unit)
-        pvt[0]['v'][2]=vz0.to(self.len_unit/self.time_unit)
-        pvt[0]['t'] = 0*self.time_unit
-        # Add the object to the list for later usage
-        self.objects.append({"name":name,
-                             "mass":m.to(self.mass_unit),
-                             "radius":r.to(self.len_unit),
-                             "pvt":pvt})
+        # Grow the structure-of-arrays storage by one object.  The
+        # trajectory arrays are long enough to hold all the values that
+        # will be calculated during this simulation, as plain floats in
+        # simulation units; run() never touches a Quantity and units
+        # are re-attached only when a trajectory is requested.
+        vel_unit = self.len_unit/self.time_unit
+        pos_new = np.zeros((self.n_steps, 1, 3), self.dtype)
+        vel_new = np.zeros((self.n_steps, 1, 3), self.dtype)
+        # Initialize the first position and velocity entry to the
+        # initial values
+        pos_new[0, 0] = [x0.to_value(self.len_unit),
+                         y0.to_value(self.len_unit),
+                         z0.to_value(self.len_unit)]
+        vel_new[0, 0] = [vx0.to_value(vel_unit),
+                         vy0.to_value(vel_unit),
+                         vz0.to_value(vel_unit)]
+        self.positions = np.concatenate((self.positions, pos_new),
+                                        axis=1)
+        self.velocities = np.concatenate((self.velocities, vel_new),
+                                         axis=1)
+        self.mass = np.append(self.mass, m.to_value(self.mass_unit))
+        self.radius = np.append(self.radius, r.to_value(self.len_unit))
+        # Keep the per-object metadata in a list for later usage.  The
+        # "<<" operator attaches the unit without copying the value the
+        # way .to() does.
+        self.objects.append(SimObject(name=name,
+                                      mass=m << self.mass_unit,
+                                      radius=r << self.len_unit,
+                                      idx=len(self.objects)))
 
     def run(self):
         """Runs all the time steps in the simulation."""
+        # The whole integration happens on the raw float arrays in
+        # simulation units.  No Quantity objects are created inside
+        # these loops.
+        # Acceleration at the start of the first step.  Each pass
+        # through the loop below evaluates the force once, at the
+        # newly calculated positions, and carries it into the next
+        # step, so both integrators cost one evaluation per step.
+        a = self._accelerations(self.positions[0])
         # Since t index = 0 is the initial condition, start by calculating
         # index = 1
         for i in range(1,self.n_steps):
+            P = self.positions[i-1]
+            V = self.velocities[i-1]
+
+            # Step 1: Update p with v and the acceleration at the
+            # start of the step
+            self.positions[i] = P + V*self._dt + a*self._dt2_half
+
+            # Step 2: the acceleration at the new positions
+            a_new = self._accelerations(self.positions[i])
+
+            # Step 3: Update v.  Velocity Verlet averages the
+            # accelerations at the two ends of the step, which is what
+            # makes it symplectic; Euler just uses the old one.
+            if self.integrator == 'verlet':
+                self.velocities[i] = V + 0.5*(a + a_new)*self._dt
+            else:
+                self.velocities[i] = V + a*self._dt
+
+            a = a_new
+
+    def _accelerations(self, P):
+        """Calculate the gravitational acceleration on every object for
+           the (n_objects, 3) position array P.  Dispatches to the
+           Barnes-Hut octree, the numba direct kernel, or the numpy
+           broadcast fallback; all of them work in plain floats in
+           simulation units.
+        """
+        if self.algorithm == 'barnes_hut':
+            return octree.accelerations(np.ascontiguousarray(P),
+                                        self.mass, self._G, self.theta,
+                                        self._eps2)
+
+        if self.device == 'cuda':
+            return self._accelerations_cuda(P)
+
+        if HAVE_NUMBA:
+            # Compiled kernel: loops over objects in threads with
+            # scalar accumulation, no temporaries
+            a = np.empty((P.shape[0], 3))
+            _accel_direct(P, self.mass, self._G, self._eps2, a)
+            return a
+
+        # Vectorized fallback: calculate the acceleration with numpy
+        # broadcasts, in tiles of _TILE x _TILE pairs.  diff[k,j] is
+        # the vector from object j to object k.  Building the pair
+        # table tile by tile (rather than all (N, N, 3) at once) keeps
+        # the working set cache-resident for large N; for N <= _TILE
+        # there's a single tile and this is the plain full broadcast.
+        n = P.shape[0]
+        a = np.zeros((n, 3))
+        # Reuse one pair of tile-sized buffers for every tile of every
+        # step instead of allocating fresh temporaries each time; the
+        # ufuncs write into them through their out= arguments
+        if self._scratch is None or self._scratch[0].dtype != P.dtype:
+            self._scratch = (np.empty((_TILE, _TILE, 3), P.dtype),
+                             np.empty((_TILE, _TILE), P.dtype))
+        diff_buf, r2_buf = self._scratch
+        for t0 in range(0, n, _TILE):
+            Pt = P[t0:t0+_TILE]
+            at = a[t0:t0+_TILE]
+            for s0 in range(0, n, _TILE):
+                Ps = P[s0:s0+_TILE]
+                # Views of the scratch buffers sized to this tile
+                # (edge tiles can be smaller than _TILE)
+                diff = diff_buf[:Pt.shape[0], :Ps.shape[0]]
+                r2 = r2_buf[:Pt.shape[0], :Ps.shape[0]]
+                np.subtract(Pt[:, None, :], Ps[None, :, :], out=diff)
+                np.einsum('ijk,ijk->ij', diff, diff, out=r2)
+                r2 += self._eps2
+                if t0 == s0:
+                    # An object exerts no force on itself.  Setting
+                    # the diagonal distances to infinity makes those
+                    # terms vanish (1/inf = 0) without a conditional.
+                    np.fill_diagonal(r2, np.inf)
+                # In-place: r2 becomes 1/r^3
+                r2 **= -1.5
+                # Sum -G*m_j*diff_kj/|diff_kj|^3 over this source tile
+                at -= self._G*np.einsum('j,ijk,ij->ik',
+                                        self.mass[s0:s0+_TILE], diff,
+                                        r2)
+        return a
+
+    def _accelerations_cuda(self, P):
+        """Calculate the direct-summation acceleration on the GPU.
+           Positions come in and accelerations go back out per step;
+           only the mass array stays resident on the device.
+        """
+        if self._d_mass is None:
+            self._d_mass = cuda.to_device(self.mass)
+        n = P.shape[0]
+        d_pos = cuda.to_device(np.ascontiguousarray(P))
+        d_acc = cuda.device_array((n, 3))
+        n_blocks = (n + _CUDA_BLOCK - 1)//_CUDA_BLOCK
+        _accel_cuda[n_blocks, _CUDA_BLOCK](d_pos, self._d_mass,
+                                           self._G, self._eps2, d_acc)
+        return d_acc.copy_to_host()
+
+    def run_batch(self, pos0, vel0):
+        """Integrate a whole ensemble of initial states in one pass.
+
+           pos0 and vel0 are Quantity arrays of shape
+           (n_batch, n_objects, 3) giving the initial position and
+           velocity of every object in every ensemble member; the
+           objects themselves (masses, radii) are the ones registered
+           with add_object.  All members are advanced together each
+           time step, which amortizes the per-step dispatch overhead
+           when N is small and the batch is large (e.g. parameter
+           sweeps).
+
+           Returns (positions, velocities) Quantity arrays of shape
+           (n_steps, n_batch, n_objects, 3).  The trajectories stored
+           on the SimRun itself are not touched.
+        """
+        if self.algorithm != 'direct' or self.device != 'cpu':
+            raise ValueError("run_batch only supports the CPU direct "
+                             "algorithm")
+        n = len(self.objects)
+        P0 = np.asarray(pos0.to_value(self.len_unit), dtype=self.dtype)
+        V0 = np.asarray(vel0.to_value(self.len_unit/self.time_unit),
+                        dtype=self.dtype)
+        if P0.ndim != 3 or P0.shape[1:] != (n, 3) or P0.shape != V0.shape:
+            raise ValueError("pos0 and vel0 must both have shape "
+                             f"(n_batch, {n}, 3)")
+        n_batch = P0.shape[0]
+        positions = np.zeros((self.n_steps, n_batch, n, 3), self.dtype)
+        velocities = np.zeros((self.n_steps, n_batch, n, 3), self.dtype)
+        positions[0] = P0
+        velocities[0] = V0
+        # Same loop as run(), with every array carrying a leading
+        # batch axis
+        a = self._accelerations_batch(positions[0])
+        for i in range(1, self.n_steps):
+            P = positions[i-1]
+            V = velocities[i-1]
+            positions[i] = P + V*self._dt + a*self._dt2_half
+            a_new = self._accelerations_batch(positions[i])
+            if self.integrator == 'verlet':
+                velocities[i] = V + 0.5*(a + a_new)*self._dt
+            else:
+                velocities[i] = V + a*self._dt
+            a = a_new
+        return (positions << self.len_unit,
+                velocities << self.len_unit/self.time_unit)
+
+    def _accelerations_batch(self, P):
+        """Calculate the direct-summation acceleration for every member
+           of an (n_batch, n_objects, 3) ensemble of positions.
+        """
+        if HAVE_NUMBA:
+            a = np.empty(P.shape)
+            _accel_direct_batch(P, self.mass, self._G, self._eps2, a)
+            return a
+
+        # Vectorized fallback: the same broadcast as the single-system
+        # case with a leading batch axis
+        diff = P[:, :, None, :] - P[:, None, :, :]
+        r2 = np.einsum('bijk,bijk->bij', diff, diff) + self._eps2
+        idx = np.arange(P.shape[1])
+        r2[:, idx, idx] = np.inf
+        return -self._G*np.einsum('j,bijk,bij->bik', self.mass, diff,
+                                  r2**-1.5)
+
+    def trajectory(self, k):
+        """Return the trajectory of object k as a structured Quantity
+           record array with 'p', 'v', and 't' fields, in simulation
+           units.  The record array is assembled on demand; the
+           underlying trajectory data lives in self.positions and
+           self.velocities.
+        """
+        pvt = np.zeros(self.n_steps, dtype=SimRun.datatype)
+        pvt['p'] = self.positions[:, k]
+        pvt['v'] = self.velocities[:, k]
+        pvt['t'] = self.times
+        return pvt << u.StructuredUnit((self.len_unit,
+                                        self.len_unit/self.time_unit,
+                                        self.time_unit))
 
-            # Consider each object in the simulation
-            for obj in self.objects:
-                # Step 1: Calculate the acceleration caused by the gravitational
-                # force from each other object in the simulation
-                a = np.zeros(3)*self.len_unit/(self.time_unit**2)
-                for src in self.objects:
-                    if obj == src:
-                        # Skip the same object
-                        continue
-
-                    # print(f"obj={obj['name']}, src={src['name']}")
-                    r = obj['pvt'][i-1]['p'] - src['pvt'][i-1]['p']
-                    r_mag = np.sqrt(np.sum(r**2))
-                    # print(f"r={r}, |r|={r_mag}")
-                    # Do the acceleration calculation for this source
-                    # and add it to the acceleration vector
-                    a += -self.G*src["mass"]*r/(r_mag**3)
-                    # print(f"a={a}")
-                    
-                # Step 2: Update p with v
-                obj['pvt'][i]['p'] = obj['pvt'][i-1]['p'] + obj['pvt'][i-1]['v']*self.dt
-
-                # Step 3: Update v with a
-                obj['pvt'][i]['v'] = obj['pvt'][i-1]['v'] + a * self.dt
-
-                # Step 4: Record the current time
-                obj['pvt'][i]['t'] = self.dt*i
-        